@@ -4,9 +4,12 @@ Generates a CSV of flashcards for import into Mochi from Tatoeba sentence
 pairs.
 """
 import csv
-import re
+import sys
 from collections import Counter
+from collections.abc import Iterable
 from dataclasses import dataclass
+from itertools import chain
+from operator import itemgetter
 
 #
 # Pair
@@ -15,10 +18,13 @@ from dataclasses import dataclass
 
 @dataclass(frozen=True)
 class Pair:
+    __slots__ = ("eng", "eng_words", "fra", "fra_words", "n_fra")
+
     eng: str
     eng_words: list[str]
     fra: str
     fra_words: list[str]
+    n_fra: int
 
     def dump(self):
         print(f"\teng={self.eng}")
@@ -31,14 +37,19 @@ class Pair:
 # Split sentences
 #
 
-WORD_BOUNDARY: re.Pattern[str] = re.compile(r"""[\s,\.!?"]""")
+# Punctuation that separates words, in addition to whitespace.
+PUNCTUATION: str = ',.!?"'
 
 
 def words(line: str) -> list[str]:
-    l = [w.strip() for w in re.split(WORD_BOUNDARY, line) if w.strip()]
-    # Skip numbers.
-    l = [w for w in l if not w.isdigit()]
-    return l
+    # Turn punctuation into spaces, so that splitting on whitespace also
+    # splits on punctuation.
+    for p in PUNCTUATION:
+        line = line.replace(p, " ")
+    # Skip numbers, and intern the words so that every occurrence of a word is
+    # the same object: dictionary lookups then match by identity, without
+    # comparing strings.
+    return [sys.intern(w) for w in line.split() if not w.isdigit()]
 
 
 #
@@ -47,36 +58,48 @@ def words(line: str) -> list[str]:
 
 FILE: str = "Sentence pairs in English-French - 2023-02-06.tsv"
 
+# Size of the read buffer for the sentence pairs file, in bytes.
+READ_BUFFER_SIZE: int = 1 << 20
+
 WORD_LIMIT: int = 10
 
-# List of French sentences to skip.
-SKIP_LIST: list[str] = ["Eu cheguei ontem."]
+# Set of French sentences to skip. Sentences are compared after lowercasing.
+SKIP_LIST: frozenset[str] = frozenset({"eu cheguei ontem."})
 
 def parse_sentences():
     """
     Parse sentence pairs.
     """
     pairs: list[Pair] = []
-    with open(FILE, "r") as stream:
+    with open(
+        FILE, "r", buffering=READ_BUFFER_SIZE, encoding="utf-8", newline=""
+    ) as stream:
         reader = csv.reader(stream, delimiter="\t")
         for row in reader:
-            eng: str = row[1].strip().lower()
+            # Handle the French sentence first, so that the English sentence
+            # is only lowercased and split for pairs that pass the French
+            # checks.
             fra: str = row[3].strip().lower()
             if fra in SKIP_LIST:
                 continue
-            eng_words: list[str] = words(eng)
             fra_words: list[str] = words(fra)
+            n_fra: int = len(fra_words)
             # Skip long sentences.
-            if len(fra_words) > WORD_LIMIT:
+            if n_fra > WORD_LIMIT:
                 continue
             # Skip if there are no proper words.
-            if (not eng_words) or (not fra_words):
+            if n_fra == 0:
+                continue
+            eng: str = row[1].strip().lower()
+            eng_words: list[str] = words(eng)
+            if not eng_words:
                 continue
             pair: Pair = Pair(
                 eng=eng,
                 eng_words=eng_words,
                 fra=fra,
                 fra_words=fra_words,
+                n_fra=n_fra,
             )
             pairs.append(pair)
     print(f"Found {len(pairs):,} sentence pairs.")
@@ -88,13 +111,12 @@ def parse_sentences():
 #
 
 
-def language_frequency_table(sentences: list[list[str]]) -> Counter[str]:
+def language_frequency_table(sentences: Iterable[list[str]]) -> Counter[str]:
     """
-    Given a list of sentences (lists of words), build up a frequency table.
+    Given an iterable of sentences (lists of words), build up a frequency
+    table.
     """
-    table: Counter[str] = Counter()
-    for sentence in sentences:
-        table.update(sentence)
+    table: Counter[str] = Counter(chain.from_iterable(sentences))
     print(f"\tFound {len(table)} words.")
     first = most_common(table)
     last = least_common(table)
@@ -109,11 +131,7 @@ def most_common(c: Counter[str]) -> str:
 
 
 def least_common(c: Counter[str]) -> str:
-    min_frequency = min(c.values())
-    least_common_items = [
-        item for item, count in c.items() if count == min_frequency
-    ]
-    return least_common_items[0]
+    return min(c.items(), key=itemgetter(1))[0]
 
 
 def counter_avg(c: Counter) -> float:
@@ -147,7 +165,7 @@ def sort_pairs(pairs: list[Pair], fra_freq: Counter[str]) -> list[Pair]:
     """
     return sorted(
         pairs,
-        key=lambda p: avg_freq(p.fra_words, fra_freq) / len(p.fra_words),
+        key=lambda p: avg_freq(p.fra_words, fra_freq) / p.n_fra,
         reverse=True,
     )
 
@@ -156,7 +174,7 @@ def avg_freq(words: list[str], tbl: Counter[str]) -> float:
     """
     Return the average frequency for the words.
     """
-    return sum(tbl[w] for w in words) / len(words)
+    return sum(map(tbl.__getitem__, words)) / len(words)
 
 #
 # Remove duplicates
@@ -194,23 +212,44 @@ CLOZE_LIMIT: int = 3
 
 @dataclass(frozen=True)
 class Cloze:
+    __slots__ = ("eng", "fra")
+
     eng: str
     fra: str
 
 
-def minimize(lst, fn):
+def cloze(sentence: str, word: str) -> str:
+    """
+    Turn every occurrence of the word in the sentence into a cloze deletion.
+    Only whole words match, so "the" does not match inside "bathe".
     """
-    Return the value that gives the smallest value of f.
+    deletion: str = f"{{{{1::{word}}}}}"
+    pieces: list[str] = []
+    # End of the last occurrence that was replaced.
+    prev: int = 0
+    start: int = sentence.find(word)
+    while start >= 0:
+        end: int = start + len(word)
+        if is_boundary(sentence, start - 1) and is_boundary(sentence, end):
+            pieces.append(sentence[prev:start])
+            pieces.append(deletion)
+            prev = end
+        start = sentence.find(word, start + 1)
+    if not pieces:
+        raise ValueError(f"'{word}' is not a word in '{sentence}'.")
+    pieces.append(sentence[prev:])
+    return "".join(pieces)
+
+
+def is_boundary(sentence: str, idx: int) -> bool:
     """
-    assert len(lst) > 0
-    smallest_index: int = 0
-    smallest_value: float = float("inf")
-    for (idx, elem) in enumerate(lst):
-        val: float = fn(elem)
-        if val < smallest_value:
-            smallest_index = idx
-            smallest_value = val
-    return lst[smallest_index]
+    Whether the character at the index separates words. The ends of the
+    sentence count as boundaries.
+    """
+    if idx < 0 or idx >= len(sentence):
+        return True
+    c: str = sentence[idx]
+    return c.isspace() or c in PUNCTUATION
 
 
 def build_clozes(
@@ -223,38 +262,40 @@ def build_clozes(
     clozes: list[Cloze] = []
     # Track how many times we've made a cloze for each word. We don't need too
     # many clozes per word.
-    cloze_count_fra: Counter[str] = Counter()
-    cloze_count_eng: Counter[str] = Counter()
+    cloze_count_fra: dict[str, int] = {}
+    cloze_count_eng: dict[str, int] = {}
     skipped_limit: int = 0
     skipped_freq: int = 0
     for pair in pairs:
         # Find the rarest words in English and French.
-        rarest_eng: str = minimize(pair.eng_words, lambda w: eng_freq[w])
-        rarest_fra: str = minimize(pair.fra_words, lambda w: fra_freq[w])
+        rarest_eng: str = min(pair.eng_words, key=eng_freq.__getitem__)
+        rarest_fra: str = min(pair.fra_words, key=fra_freq.__getitem__)
         # Cloze the English word.
-        if cloze_count_eng[rarest_eng] == CLOZE_LIMIT:
+        count_eng: int = cloze_count_eng.get(rarest_eng, 0)
+        if count_eng == CLOZE_LIMIT:
             skipped_limit += 1
         elif rarest_eng not in eng_common:
             skipped_freq += 1
         else:
             cloze_eng: Cloze = Cloze(
-                eng=pair.eng.replace(rarest_eng, "{{1::" + rarest_eng + "}}"),
+                eng=cloze(pair.eng, rarest_eng),
                 fra=pair.fra,
             )
             clozes.append(cloze_eng)
-            cloze_count_eng.update({rarest_eng: 1})
+            cloze_count_eng[rarest_eng] = count_eng + 1
         # Cloze the French word.
-        if cloze_count_fra[rarest_fra] == CLOZE_LIMIT:
+        count_fra: int = cloze_count_fra.get(rarest_fra, 0)
+        if count_fra == CLOZE_LIMIT:
             skipped_limit += 1
         elif rarest_fra not in fra_common:
             skipped_freq += 1
         else:
             cloze_fra: Cloze = Cloze(
                 eng=pair.eng,
-                fra=pair.fra.replace(rarest_fra, "{{1::" + rarest_fra + "}}"),
+                fra=cloze(pair.fra, rarest_fra),
             )
             clozes.append(cloze_fra)
-            cloze_count_fra.update({rarest_fra: 1})
+            cloze_count_fra[rarest_fra] = count_fra + 1
     print(
         f"Skipped {skipped_limit} clozes because the word appeared too many "
         "times."
@@ -278,18 +319,21 @@ def dump_clozes(clozes: list[Cloze]):
     print(f"Dumping {len(units)} units.")
     for (unit_id, unit) in enumerate(units):
         with open(f"output/unit_{unit_id}.csv", "w") as stream:
-            writer = csv.writer(
-                stream,
-                delimiter=",",
-                quotechar='"',
-                quoting=csv.QUOTE_ALL,
-                lineterminator="\n",
+            stream.write(csv_row("English", "French"))
+            stream.writelines(
+                csv_row(cloze.eng.capitalize(), cloze.fra.capitalize())
+                for cloze in unit
             )
-            writer.writerow(["English", "French"])
-            for cloze in unit:
-                writer.writerow(
-                    [cloze.eng.capitalize(), cloze.fra.capitalize()]
-                )
+
+
+def csv_row(eng: str, fra: str) -> str:
+    """
+    Format a row of the output CSV. Every field is quoted, with quotes inside
+    it doubled, which is what csv.writer does with csv.QUOTE_ALL.
+    """
+    eng = eng.replace('"', '""')
+    fra = fra.replace('"', '""')
+    return f'"{eng}","{fra}"\n'
 
 
 def group(lst, n):
@@ -310,11 +354,11 @@ def main():
     # Building frequency table.
     print("English frequency table:")
     eng_freq: Counter[str] = language_frequency_table(
-        [pair.eng_words for pair in pairs]
+        pair.eng_words for pair in pairs
     )
     print("French frequency table:")
     fra_freq: Counter[str] = language_frequency_table(
-        [pair.fra_words for pair in pairs]
+        pair.fra_words for pair in pairs
     )
     # Find the frequency cutoff.
     eng_common = most_common_words(eng_freq)